@@ -3,15 +3,27 @@
 ##  by Ralf Brown, Carnegie Mellon University
 ##  last edit: 30aug2019
 
-import argparse
+import atexit
+import functools
+import io
 import json
 import os
 import re
 import sys
+import threading
+import types
 from textwrap import wrap
-import urllib, urllib.parse, urllib.request
+import urllib, urllib.parse
 from urllib.error import HTTPError
 from time import sleep
+try:
+    import orjson	# much faster JSON encoding/decoding, if installed
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 ######################################################################
 ####     CONFIGURATION						  ####
@@ -19,9 +31,47 @@ from time import sleep
 HACKERRANK_HOST = "www.hackerrank.com"
 API_BASE = "/x/api/v3/"
 
+# the user ID which owns HackerRank's own library of questions
+HACKERRANK_OWNER_ID = '41872'
+
 # HR returns 10 results per page by default, supports a maximum of 100
 MAX_PER_PAGE = 50
 
+# number of pages of a listing to request from HR at once
+MAX_CONCURRENT_REQUESTS = 16
+
+# remember the names of at most this many questions per client
+MAX_CACHED_QUESTION_NAMES = 4096
+
+# give up on a rate-limited request after retrying this many times
+MAX_RETRIES = 5
+
+# follow at most this many redirects of a GET request (the same limit as urllib)
+MAX_REDIRECTS = 10
+
+# the socket on which --daemon listens for commands, in $XDG_RUNTIME_DIR (or as a dotfile in $HOME)
+DAEMON_SOCKET = "hackerrank.sock"
+
+######################################################################
+
+# formatting tags which clean_HTML strips, and <div>s whose attributes it strips
+_RE_FORMAT_TAGS = re.compile("[<]/?(?:(?:span|font|strong)[^>]*|em)[>]")
+_RE_DIV_ATTRS = re.compile("[<]div [^>]*[>]")
+
+# requests which can safely be resent if the connection fails before we see the response
+_IDEMPOTENT_METHODS = frozenset(('GET','HEAD','OPTIONS','PUT','DELETE'))
+
+# default for dict.pop() which distinguishes a missing key from a None value
+_MISSING = object()
+
+def _maybe_int(value):
+    # convert whole-number scores to int so that they display without a trailing '.0'
+    try:
+        ival = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return value
+    return ival if ival == value else value
+
 ######################################################################
 
 class HRException(Exception):
@@ -32,22 +82,58 @@ class HRException(Exception):
 ######################################################################
 
 class HackerRank():
+    # the API token is read from disk only once per process
+    api_token = None
+    api_token_lock = threading.Lock()
+    # the instances made by shared_client, whose per-run caches a --daemon resets before each command
+    shared_clients = []
+
     def __init__(self, host = HACKERRANK_HOST, verbose = False):
         self.hostname = host
         self.api_base = 'https://' + self.hostname + API_BASE
         self.verbose = verbose
         self.dryrun = False
         self.http_error_hook = None
-        self.qname_cache = {}
-        tokenfile = os.environ['HOME'] + '/.hackerrank_api_token'
-        try:
-            with open(tokenfile) as f:
-                self.token = f.read().strip()
-        except Exception as err:
-            print(err)
-            return
+        # names seen in question listings or looked up, keyed by ID, in the order first seen
+        self.known_question_names = {}
+        self.known_question_names_lock = threading.Lock()
+        self.question_bank_pages = None	# length of the whole question bank in pages, once we've seen page one
+        self.question_bank_loaded = False
+        # invitation templates rarely change, so fetch them only once (see invalidate_templates)
+        self.cached_invite_templates = functools.lru_cache(maxsize=1)(self.fetch_invite_templates)
+        self.cached_invite_template = functools.lru_cache(maxsize=128)(self.fetch_invite_template)
+        self.connections = {}	# persistent keep-alive connections, keyed by (thread,host)
+        self.executor = None
+        token = HackerRank.read_token()
+        if token is not None:
+            self.token = token
         return
 
+    @classmethod
+    def read_token(cls):
+        with cls.api_token_lock:
+            if cls.api_token is None:
+                tokenfile = os.environ['HOME'] + '/.hackerrank_api_token'
+                try:
+                    with open(tokenfile) as f:
+                        cls.api_token = f.read().strip()
+                except Exception as err:
+                    print(err)
+            return cls.api_token
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def shared_client(verbose=False):
+        # one instance (and thus one set of connections and caches) per process for each verbosity
+        hr = HackerRank(verbose=verbose)
+        atexit.register(hr.close)
+        HackerRank.shared_clients.append(hr)
+        return hr
+
+    @staticmethod
+    def client(args):
+        return HackerRank.shared_client(bool(args.verbose))
+
     def run_verbosely(self, verbosity):
         self.verbose = verbosity
         return
@@ -58,13 +144,55 @@ class HackerRank():
 
     @staticmethod
     def has_limit(arglist):
-        for a,v in arglist:
-            if a == 'limit':
-                return True
-        return False
+        return any(a == 'limit' for a,_ in arglist)
+
+    def connection(self, netloc, reconnect=False):
+        # an HTTPConnection can only carry one request at a time, so each thread gets its own
+        import http.client	# deferred (along with ssl) until we actually talk to the server
+        key = (threading.get_ident(), netloc)
+        conn = self.connections.get(key)
+        if conn is None or reconnect:
+            if conn is not None:
+                conn.close()
+            conn = http.client.HTTPSConnection(netloc)
+            self.connections[key] = conn
+        return conn
+
+    @staticmethod
+    def connection_dropped(conn):
+        # an idle keep-alive socket only becomes readable once the server has closed its end
+        if conn.sock is None:
+            return False
+        import select
+        return bool(select.select([conn.sock], [], [], 0)[0])
+
+    def thread_pool(self):
+        if self.executor is None:
+            import concurrent.futures
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for conn in list(self.connections.values()):
+            conn.close()
+        self.connections = {}
+        return
+
+    @staticmethod
+    def JSON_value(value):
+        # boolean arguments given as strings (e.g. from the commandline) must be sent as JSON booleans
+        if value == 'true':
+            return True
+        if value == 'false':
+            return False
+        return value
 
     ## staffeli/canvas.py showed how to call REST API
-    def mkrequest(self, method, url, arglist, use_JSON_data):
+    def mkrequest(self, method, url, arglist, use_JSON_data, redirects=0):
+        import http.client
         # convert a relative URL into an absolute URL by appending it to the base URL for the API
         if '://' not in url:
             url = self.api_base + url
@@ -73,59 +201,156 @@ class HackerRank():
         headers = { 'Authorization': 'Bearer ' + self.token }
         if use_JSON_data:
             if type(arglist) is type(''):
-                qstring = ''.join(c if c != '\n' else ' ' for c in arglist)
+                qstring = ''.join(c if c != '\n' else ' ' for c in arglist).encode('utf-8')
             else:
                 argdict = {}
                 for k,v in arglist:
-                    argdict[k] = v
-                qstring = json.dumps(argdict)
-            qstring = qstring.encode('utf-8')
-            qstring = qstring.replace(b'"true"',b'true')
+                    argdict[k] = self.JSON_value(v)
+                qstring = json_dumps(argdict)
             headers['Content-Type'] = 'application/json'
         else:
-            # add page-size to request
-            if not self.has_limit(arglist):
-                arglist.append(('limit',MAX_PER_PAGE))
-            qstring = urllib.parse.urlencode(arglist, safe='[]@,', doseq=True).encode('utf-8')
             if method == 'GET':
+                # GET arguments go in the URL (unless it already has them, as with a 'next' link), never the body
                 if '?' not in url:
-                    url = url + '?' + str(qstring,'utf-8')
+                    url = url + '?' + urllib.parse.urlencode(arglist, safe='[]@,', doseq=True)
                 qstring = None
+            else:
+                qstring = urllib.parse.urlencode(arglist, safe='[]@,', doseq=True).encode('utf-8')
         if self.verbose:
             print('{}ing url:'.format(method),url)
             if qstring:
                 print("Encoded args:",qstring)
-        req = urllib.request.Request(url, data=qstring, method=method, headers=headers)
-        return urllib.request.urlopen(req, data=qstring)
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        conn = self.connection(parts.netloc)
+        if method not in _IDEMPOTENT_METHODS and self.connection_dropped(conn):
+            conn = self.connection(parts.netloc, reconnect=True)	# so that we won't need to resend it
+        sent = False
+        try:
+            conn.request(method, path, body=qstring, headers=headers)
+            sent = True
+            resp = conn.getresponse()
+        except (ConnectionError, http.client.ImproperConnectionState):
+            # the server may have dropped our idle keep-alive connection, so open a new one and resend -- unless
+            #   the server might already have acted on a request which must not be repeated (e.g. an invitation)
+            conn = self.connection(parts.netloc, reconnect=True)
+            if sent and method not in _IDEMPOTENT_METHODS:
+                raise
+            conn.request(method, path, body=qstring, headers=headers)
+            resp = conn.getresponse()
+        if resp.status >= 300:
+            # consume the body so that the connection can be reused
+            body = resp.read()
+            location = resp.headers.get('Location')
+            if resp.status < 400 and location and method == 'GET' and redirects < MAX_REDIRECTS:
+                target = urllib.parse.urljoin(url, location)
+                # don't send our API token to some other host
+                if urllib.parse.urlsplit(target).netloc == parts.netloc:
+                    return self.mkrequest(method, target, None, use_JSON_data, redirects+1)
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+        return resp
 
-    def call_api(self, method, url, arglist=None, all_pages=False, use_JSON_data=False):
+    @staticmethod
+    def retry_delay(err, attempt):
+        # honor the server's Retry-After (in seconds) if given, else back off exponentially
+        wait = err.headers.get('Retry-After') if err.headers else None
+        try:
+            return max(0, int(wait))
+        except (TypeError, ValueError):
+            return 2 ** attempt
+
+    def fetch_page(self, method, url, arglist=None, use_JSON_data=False):
+        attempt = 0
+        while True:
+            try:
+                with self.mkrequest(method, url, arglist, use_JSON_data) as f:
+                    if f.status == 204:  # No Content
+                        if self.verbose:
+                            print('204 No Content')
+                        return None
+                    return json_loads(f.read())
+            except HTTPError as err:
+                if err.code != 429 or attempt >= MAX_RETRIES:
+                    raise
+                delay = self.retry_delay(err, attempt)
+                print('429 Rate Limit Exceeded, retrying in {}s'.format(delay), file=sys.stderr)
+                sleep(delay)
+                attempt += 1
+
+    @staticmethod
+    def page_urls(next_url, total):
+        # generate the URLs of all remaining pages from the 'next' link of the current page
+        parts = urllib.parse.urlsplit(next_url)
+        query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        params = dict(query)
+        if 'offset' not in params or 'limit' not in params:
+            return None
+        try:
+            offset = int(params['offset'])
+            limit = int(params['limit'])
+        except ValueError:
+            return None
+        if limit <= 0:
+            return None
+        # encode the unchanging part of the query just once
+        prefix = urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(
+            [(a,v) for a,v in query if a != 'offset'], safe='[]@,')))
+        return ['{}&offset={}'.format(prefix,off) for off in range(offset, total, limit)]
+
+    def iter_pages(self, method, url, arglist=None, all_pages=False, use_JSON_data=False):
+        # generate each page of results as it arrives
         if arglist is None:
             arglist = []
-        entries = []
+        if not use_JSON_data and not self.has_limit(arglist):
+            # add page-size to request (without modifying the caller's list)
+            arglist = arglist + [('limit',MAX_PER_PAGE)]
+        if method == 'GET' and arglist:
+            # encode the arguments once; later pages follow the already-encoded 'next' links verbatim
+            if '://' not in url:
+                url = self.api_base + url
+            url += ('&' if '?' in url else '?') + urllib.parse.urlencode(arglist, safe='[]@,', doseq=True)
+            arglist = None
         while url:
-            with self.mkrequest(method, url, arglist, use_JSON_data) as f:
-                if f.getcode() == 204:  # No Content
-                    if self.verbose:
-                        print('204 No Content')
-                    break
-                if f.getcode() == 429:
-                    print('429 Rate Limit Exceeded')
-                data = json.loads(f.read().decode('utf-8'))
-                if not entries:
-                    entries = data
-                elif 'data' in data:
-                    if 'data' in entries:
-                        entries['data'] += data['data']
-                    else:
-                        entries = data
+            data = self.fetch_page(method, url, arglist, use_JSON_data)
+            if data is None:
+                return
+            yield data
+            url = data['next'] if 'next' in data else None
+            if url == '' or not all_pages:
+                url = None
+            elif method == 'GET' and 'total' in data:
+                # the first page told us how many records there are, so request the rest in parallel
+                urls = self.page_urls(url, data['total'])
+                if urls is not None:
+                    for page in self.thread_pool().map(lambda url: self.fetch_page('GET', url), urls):
+                        if page is not None:
+                            yield page
+                    return
+
+    def iter_api(self, method, url, arglist=None, all_pages=False, use_JSON_data=False):
+        # generate the individual records of a (possibly paginated) listing one at a time
+        for data in self.iter_pages(method, url, arglist, all_pages, use_JSON_data):
+            if 'data' in data:
+                yield from data['data']
+            else:
+                yield data
+
+    def call_api(self, method, url, arglist=None, all_pages=False, use_JSON_data=False):
+        entries = []
+        for data in self.iter_pages(method, url, arglist, all_pages, use_JSON_data):
+            if not entries:
+                entries = data
+            elif 'data' in data:
+                if 'data' in entries:
+                    entries['data'] += data['data']
                 else:
-                    print("can't concatenate!")
-                url = data['next'] if 'next' in data else None
-                if url == '' or not all_pages:
-                    url = None
+                    entries = data
+            else:
+                print("can't concatenate!")
         return entries
 
-    def get(self,url,arglist=None,fields=None,all_pages=False):
+    @staticmethod
+    def add_fields(arglist,fields):
         if fields is not None and fields != [] and fields != '':
             if type(fields) == type([]):
                 fields = ','.join(fields)
@@ -133,6 +358,10 @@ class HackerRank():
                 arglist = [('fields',fields)]
             else:
                 arglist.append(('fields',fields))
+        return arglist
+
+    def get(self,url,arglist=None,fields=None,all_pages=False):
+        arglist = self.add_fields(arglist,fields)
         try:
             result = self.call_api('GET', url, arglist=arglist, all_pages=all_pages)
         except HTTPError as err:
@@ -143,6 +372,40 @@ class HackerRank():
             result = []
         return result
 
+    def report_http_error(self,err,method,url):
+        if self.http_error_hook:
+            self.http_error_hook(err)
+        else:
+            print(err,'for',method,url)
+        return
+
+    def iter_records(self,url,arglist=None,fields=None):
+        # stream every record of a paginated listing as it arrives, without holding the whole listing; raises
+        #   HTTPError if a page fails, by which time the records of the earlier pages will have been generated
+        return self.iter_api('GET', url, arglist=self.add_fields(arglist,fields), all_pages=True)
+
+    def get_records(self,url,arglist=None,fields=None):
+        # all records of a paginated listing, or [] if any page fails, so that callers never mistake a
+        #   truncated listing for a complete one
+        try:
+            return list(self.iter_records(url,arglist,fields))
+        except HTTPError as err:
+            self.report_http_error(err,'GET',url)
+            return []
+
+    def iter_get(self,url,arglist=None,fields=None,all_pages=True):
+        # stream the records as they arrive; if a later page fails, the earlier records will already
+        #   have been generated, so use get_records unless a partial listing is acceptable
+        arglist = self.add_fields(arglist,fields)
+        try:
+            yield from self.iter_api('GET', url, arglist=arglist, all_pages=all_pages)
+        except HTTPError as err:
+            if self.http_error_hook:
+                self.http_error_hook(err)
+            else:
+                print(err,'for GET',url)
+        return
+
     def put(self,url,arglist=None):
         if self.dryrun:
             print('DRY RUN: would have PUT',url,'with args:\n',arglist)
@@ -180,7 +443,7 @@ class HackerRank():
         except HTTPError as err:
             print(err,'for DELETE',url)
 
-    def options(self,url,arglist=[]):
+    def options(self,url,arglist=None):
         try:
             return self.call_api('OPTIONS', url, arglist)
         except HTTPError as err:
@@ -195,6 +458,9 @@ class HackerRank():
     def list_users(self):
         return self.get('users',all_pages=True)
 
+    def iter_users(self):
+        return self.iter_records('users')
+
     def get_user(self,user_id):
         return self.get('users/{}'.format(user_id))
 
@@ -267,13 +533,14 @@ class HackerRank():
         return self.get('tests/{}/inviters'.format(test_id),all_pages=True)
 
     def list_test_candidates(self,test_id, fields=None, filters=None):
-        c_list = self.get('tests/{}/candidates'.format(test_id),arglist=filters,fields=fields,all_pages=True)
-        return c_list['data'] if 'data' in c_list else c_list
+        return self.get_records('tests/{}/candidates'.format(test_id),arglist=filters,fields=fields)
+
+    def iter_test_candidates(self,test_id, fields=None, filters=None):
+        return self.iter_records('tests/{}/candidates'.format(test_id),arglist=filters,fields=fields)
             
     def invite_test_candidate(self,test_id,fullname,email,msg="",template=None,send_email=True,tags=None,addtime=0):
         arglist=[('email',email),
-                 ('send_email','true' if send_email else 'false')]
-#                 ('send_email',send_email)]
+                 ('send_email',bool(send_email))]
         if fullname:
             arglist.append(('full_name',fullname))
         if msg and msg != '':
@@ -287,38 +554,51 @@ class HackerRank():
             arglist.append(('accommodations','{"additional_time_percent":'+str(addtime)+'}'))
         return self.post('tests/{}/candidates'.format(test_id),arglist)
 
+    def invite_test_candidates(self,test_id,emails,msg="",template=None,send_email=True,tags=None,addtime=0):
+        # HR has no bulk-invite endpoint, so send the individual invitations in parallel; every invitation has
+        #   been submitted by the time this returns an iterator over the (email,response) pairs in the order
+        #   given.  A dry run sends nothing, so it just runs through the emails in order, which also keeps its
+        #   'DRY RUN' notes from being printed by several threads at once in arbitrary order
+        invite = lambda email: (email,self.invite_test_candidate(test_id,None,email,msg,template,send_email,tags,addtime))
+        if self.dryrun:
+            return iter([invite(email) for email in emails])
+        pool = self.thread_pool()
+        futures = [pool.submit(invite,email) for email in emails]
+        return (f.result() for f in futures)
+
     def get_all_test_scores(self,test_id,all_questions=True,include_incomplete=False,filters=None):
-        c_info = self.list_test_candidates(test_id,filters=filters)
         scores = []
-        all_qs = set()
-        for cand in c_info:
-            if 'questions' not in cand:
-                continue
-            for q in cand['questions']:
-                all_qs.add(q)
-        for cand in c_info:
-            score = cand['score']
-            endtime = cand['attempt_endtime']
-            if not include_incomplete and (score is None or ('status' in cand and cand['status'] == 0)):
-                continue
-            if score is not None or score == int(score):
-                score = int(score)
-            id = cand['id']
-            fullname = cand['full_name']
-            email = cand['email']
-            andrew = self.get_Andrew_ID(cand)
-            if andrew and andrew[0] == '/':
-                andrew = andrew[1:]
-            percent = cand['percentage_score']
-            questions = cand['questions']
-            for q in all_qs:
-                if q not in questions and all_questions:
-                    questions[q] = '0'
-                elif q in questions and questions[q] == int(questions[q]):
-                    questions[q] = int(questions[q])
-            plag = cand['plagiarism'] if cand['plagiarism_status'] == True else None
-            scores += [{'id': id, 'fullname': fullname, 'email': email, 'andrew': andrew, 'score': score,
-                        'percent': percent, 'questions': questions, 'endtime': endtime, 'plag': plag}]
+        # union of the questions seen by any candidate, in order of first appearance
+        all_qs = {}
+        try:
+            for cand in self.iter_test_candidates(test_id,filters=filters):
+                if cand.get('questions'):
+                    all_qs.update(dict.fromkeys(cand['questions']))
+                score = cand['score']
+                endtime = cand['attempt_endtime']
+                if not include_incomplete and (score is None or ('status' in cand and cand['status'] == 0)):
+                    continue
+                score = _maybe_int(score)
+                id = cand['id']
+                fullname = cand['full_name']
+                email = cand['email']
+                andrew = self.get_Andrew_ID(cand)
+                if andrew and andrew[0] == '/':
+                    andrew = andrew[1:]
+                percent = cand['percentage_score']
+                questions = {q: _maybe_int(v) for q, v in cand['questions'].items()}
+                plag = cand['plagiarism'] if cand['plagiarism_status'] == True else None
+                scores += [{'id': id, 'fullname': fullname, 'email': email, 'andrew': andrew, 'score': score,
+                            'percent': percent, 'questions': questions, 'endtime': endtime, 'plag': plag}]
+        except HTTPError as err:
+            # return nothing rather than a truncated cohort which looks complete
+            self.report_http_error(err,'GET','tests/{}/candidates'.format(test_id))
+            return []
+        if all_questions:
+            # now that every candidate has been seen, fill in zeros for the questions they did not answer
+            for s in scores:
+                questions = s['questions']
+                s['questions'] = {q: questions.get(q,'0') for q in all_qs}
         return scores
 
     def get_test_candidate(self,test_id,cand_id, fields=None):
@@ -366,7 +646,14 @@ class HackerRank():
     def delete_interview(self,iview_id,settings):
         return self.delete('interviews/{}'.format(iview_id))
 
-    def list_all_questions(self,qtype=None,tags=None,languages=None):
+    def list_all_questions(self,qtype=None,tags=None,languages=None,exclude_owner=None):
+        try:
+            return list(self.iter_all_questions(qtype,tags,languages,exclude_owner))
+        except HTTPError as err:
+            self.report_http_error(err,'GET','questions')
+            return []
+
+    def iter_all_questions(self,qtype=None,tags=None,languages=None,exclude_owner=None):
 #        arglist=[('fields','id,name,type,languages,test_case_count,status,created_at')]
 #	(requesting a partial response results in empty records for each question!)
         arglist=[]
@@ -376,8 +663,13 @@ class HackerRank():
             arglist.append(('tags',tags))
         if languages and languages != '':
             arglist.append(('languages',languages))
-        q_info = self.get('questions',arglist,all_pages=True)
-        return q_info['data'] if 'data' in q_info else q_info
+        # HR has no server-side filter on owner, so drop unwanted questions as they stream in; like
+        #   iter_records, raises HTTPError if a page fails
+        for q in self.iter_records('questions',arglist):
+            if 'id' in q and 'name' in q:
+                self.remember_question_name(q['id'],q['name'])
+            if exclude_owner is None or q.get('owner') != exclude_owner:
+                yield q
 
     def list_questions(self,type,tags,languages,offset,limit=MAX_PER_PAGE):
         arglist=[]
@@ -396,30 +688,149 @@ class HackerRank():
 #  problem with API: specifying partial response results in empty records being returned!
 #        return self.get('questions/{}'.format(q_id),fields=fields)
 
+    def remember_question_name(self,q_id,name):
+        names = self.known_question_names
+        with self.known_question_names_lock:
+            names[str(q_id)] = name
+            # keep memory bounded (even for a huge question bank) by forgetting the oldest names
+            while len(names) > MAX_CACHED_QUESTION_NAMES:
+                del names[next(iter(names))]
+        return
+
+    def fetch_question_name(self,q_id):
+        name = self.known_question_names.get(str(q_id))
+        if name is not None:
+            return name
+        result = self.show_question(q_id,'name')
+        if result and 'name' in result:
+            self.remember_question_name(q_id,result['name'])
+            return result['name']
+        # raise rather than return, so that failed lookups are retried next time
+        raise KeyError(q_id)
+
     def get_question_name(self,q_id,verbose=None):
-        if q_id in self.qname_cache:
-            return self.qname_cache[q_id]
         if verbose is not None:
             orig_verbose = self.verbose
             self.verbose = verbose
-        result = self.show_question(q_id,'name')
-        if verbose is not None:
-            self.verbose = orig_verbose
-        if result and 'name' in result:
-            name = result['name']
-            self.qname_cache[q_id] = name
-            return name
-        else:
+        try:
+            return self.fetch_question_name(q_id)
+        except KeyError:
+            return '{unknown}'
+        finally:
+            if verbose is not None:
+                self.verbose = orig_verbose
+
+    def shorten_question_name(self,q_id):
+        # strip any parenthesized suffix from the name; raises KeyError like fetch_question_name
+        name = self.fetch_question_name(q_id)
+        return name.rpartition('(')[0] if '(' in name else name
+
+    def get_short_question_name(self,q_id):
+        try:
+            return self.shorten_question_name(q_id)
+        except KeyError:
             return '{unknown}'
 
+    def unknown_question_ids(self,q_ids):
+        return sorted(q_id for q_id in set(q_ids) if str(q_id) not in self.known_question_names)
+
+    def prefetch_question_names(self,q_ids,verbose=None):
+        # look up all of the given questions in parallel, so that later get_question_name calls hit the cache
+        if verbose is not None:
+            orig_verbose = self.verbose
+            self.verbose = verbose
+        try:
+            unknown = self.unknown_question_ids(q_ids)
+            if len(unknown) > MAX_PER_PAGE and not self.question_bank_loaded:
+                # HR can't fetch a list of questions by ID, but paging through the whole question bank may
+                #   be cheaper than this many individual lookups (a smaller set takes just one round trip
+                #   in parallel); anything not found is then looked up singly
+                self.load_question_names(wanted=unknown)
+                unknown = self.unknown_question_ids(unknown)
+            if len(unknown) <= 1:
+                for q_id in unknown:
+                    self.get_question_name(q_id)
+            else:
+                list(self.thread_pool().map(self.get_question_name, unknown))
+        finally:
+            if verbose is not None:
+                self.verbose = orig_verbose
+        return
+
+    def load_question_names(self,verbose=None,wanted=None):
+        # record the name of every question in the bank, paging through it at most once per client; given the
+        #   wanted IDs, stop after the first page unless the rest takes fewer requests than looking up those
+        #   which are still unknown
+        bank_too_long = lambda: wanted is not None and \
+                        self.question_bank_pages - 1 >= len(self.unknown_question_ids(wanted))
+        if self.question_bank_loaded or (self.question_bank_pages is not None and bank_too_long()):
+            return
+        if verbose is not None:
+            orig_verbose = self.verbose
+            self.verbose = verbose
+        try:
+            pages = self.iter_pages('GET','questions',all_pages=True)
+            for page in pages:
+                for q in page.get('data',[]):
+                    if 'id' in q and 'name' in q:
+                        self.remember_question_name(q['id'],q['name'])
+                if self.question_bank_pages is None:
+                    self.question_bank_pages = -(-page.get('total',0) // MAX_PER_PAGE)
+                    if bank_too_long():
+                        pages.close()
+                        return
+            self.question_bank_loaded = True
+        except HTTPError as err:
+            self.question_bank_loaded = True	# don't retry on every prefetch
+            if self.http_error_hook:
+                self.http_error_hook(err)
+            else:
+                print(err,'for GET questions')
+        finally:
+            if verbose is not None:
+                self.verbose = orig_verbose
+        return
+
     #def update_question(self,q_id,settings):
 
-    def list_invite_templates(self):
+    def fetch_invite_templates(self):
         t_info = self.get('templates',all_pages=True)
+        if not t_info:
+            raise KeyError('templates')	# raise rather than return, so that failed lookups are not cached
         return t_info['data'] if 'data' in t_info else t_info
 
+    def list_invite_templates(self):
+        # the cached list is shared between callers, so don't modify it
+        try:
+            return self.cached_invite_templates()
+        except KeyError:
+            return []
+
+    def fetch_invite_template(self,t_id):
+        t_info = self.get('templates/{}'.format(t_id))
+        if not t_info:
+            raise KeyError(t_id)
+        return t_info
+
     def show_invite_template(self,t_id):
-        return self.get('templates/{}'.format(t_id))
+        try:
+            return self.cached_invite_template(t_id)
+        except KeyError:
+            return []
+
+    def reset_run_caches(self):
+        # forget whatever may have changed on the server (e.g. through the web interface) since the last
+        #   command run by a long-lived process
+        self.invalidate_templates()
+        self.question_bank_loaded = False
+        self.question_bank_pages = None
+        return
+
+    def invalidate_templates(self):
+        # call after creating, changing, or deleting an invitation template
+        self.cached_invite_templates.cache_clear()
+        self.cached_invite_template.cache_clear()
+        return
 
     def list_all_audit_logs(self):
         return self.get('audit_log',all_pages=True)
@@ -431,25 +842,21 @@ class HackerRank():
     def late_score(score, late_penalty):
         if late_penalty > 0.0:
             score = int(10.0 * score * (1.0 - late_penalty) + 0.5)/10.0
-        if score == int(score):
-            score = int(score)
-        return score
+        return _maybe_int(score)
 
     def feedback(self, q_info, late_penalty):
         if not q_info:
             return '\t0\t--total-- (not yet submitted)'
         fb = ''
         total = 0.0
+        self.prefetch_question_names(q_info.keys())
         for q_num in q_info:
             score = q_info[q_num]
             if score:
                 total += float(score)
-            q_name = self.get_question_name(q_num)
-            if '(' in q_name:
-                q_name, _, _ = q_name.rpartition('(')
+            q_name = self.get_short_question_name(q_num)
             fb += '\t{}\t{}\n'.format(score,q_name)
-        if total == int(total):
-            total = int(total)
+        total = _maybe_int(total)
         if late_penalty > 0.0:
             total = HackerRank.late_score(total,late_penalty)
         fb += '\t{}\t--total--'.format(total)
@@ -461,10 +868,8 @@ class HackerRank():
     #### utility functions to help with display
     @staticmethod
     def clean_HTML(text):
-        text = re.sub("[<]/?(span|font)[^>]*[>]","",text)
-        text = re.sub("[<]/?strong[^>]*[>]","",text)
-        text = re.sub("[<]/?em[>]","",text)
-        text = re.sub("[<]div [^>]*[>]","<div>",text)
+        text = _RE_FORMAT_TAGS.sub("",text)
+        text = _RE_DIV_ATTRS.sub("<div>",text)
         return text
 
     @staticmethod
@@ -475,7 +880,7 @@ class HackerRank():
                     return '/'+det['value']
         return ''
         
-    def display_owner(self,info,verbose=False):
+    def format_owner(self,info,verbose=False):
         if 'owner' in info:
             if verbose:
                 orig_verbose = self.verbose
@@ -483,64 +888,65 @@ class HackerRank():
                 owner = self.get_user(info['owner'])
                 self.verbose = orig_verbose
                 if owner:
-                    print("OWNER:\t{} {} ({})".format(owner['firstname'],owner['lastname'],owner['email']))
+                    return "OWNER:\t{} {} ({})\n".format(owner['firstname'],owner['lastname'],owner['email'])
             else:
-                print("OWNER:\t{}\t\t(use -v to get name/email)".format(info['owner']))
+                return "OWNER:\t{}\t\t(use -v to get name/email)\n".format(info['owner'])
+        return ''
+
+    def display_owner(self,info,verbose=False):
+        sys.stdout.write(self.format_owner(info,verbose))
         return
 
     def print_question(self, q_info, verbose, compact):
         if compact:
-            if q_info['owner'] == '41872':  ## question by HackerRank?
+            if q_info['owner'] == HACKERRANK_OWNER_ID:  ## question by HackerRank?
                 return True
-            cases = q_info['test_case_count'] if 'test_case_count' in q_info else 0
+            cases = q_info.get('test_case_count',0)
             label = 'tests'
-            if cases == 0 and 'options' in q_info:
-                cases = len(q_info['options'])
-                label = 'options'
+            if cases == 0:
+                options = q_info.get('options',_MISSING)
+                if options is not _MISSING:
+                    cases = len(options)
+                    label = 'options'
             print("{}: {} {} ({} {}): {}".format(q_info['id'],q_info['status'],q_info['type'],cases,label,
                                                               q_info['name']))
             return True
-        print("NAME:\t{}".format(q_info['name']))
-        del q_info['name']
-        if 'created_at' in q_info:
-            print("CREATE:\t{}".format(q_info['created_at']))
-            del q_info['created_at']
-        print("TYPE:\t{} ({})".format(q_info['type'],q_info['status']))
-        del q_info['type']
-        del q_info['status']
-        if 'sample_test_case_count' in q_info:
-            print("TESTS:\t{} ({} sample)".format(q_info['test_case_count'],q_info['sample_test_case_count']))
-            del q_info['test_case_count']
-            del q_info['sample_test_case_count']
-        elif 'test_case_count' in q_info:
-            if q_info['test_case_count']:
-                print("TESTS:\t{}".format(q_info['test_case_count']))
-            del q_info['test_case_count']
-        if 'tags' in q_info:
-            print("TAGS:\t{}".format(', '.join(q_info['tags'])))
-            del q_info['tags']
-        print("ID:\t{} (API), {} (unique)".format(q_info['id'],q_info['unique_id']))
-        del q_info['id']
-        del q_info['unique_id']
-        if 'languages' in q_info:
-            if q_info['languages']:
-                print("LANG:\t{}".format(', '.join(q_info['languages'])))
-            del q_info['languages']
-        self.display_owner(q_info,verbose)
+        # build up the complete listing and output it with a single write
+        out = []
+        append = out.append
+        append("NAME:\t{}\n".format(q_info.pop('name')))
+        created = q_info.pop('created_at',_MISSING)
+        if created is not _MISSING:
+            append("CREATE:\t{}\n".format(created))
+        append("TYPE:\t{} ({})\n".format(q_info.pop('type'),q_info.pop('status')))
+        samples = q_info.pop('sample_test_case_count',_MISSING)
+        if samples is not _MISSING:
+            append("TESTS:\t{} ({} sample)\n".format(q_info.pop('test_case_count'),samples))
+        else:
+            cases = q_info.pop('test_case_count',_MISSING)
+            if cases is not _MISSING and cases:
+                append("TESTS:\t{}\n".format(cases))
+        tags = q_info.pop('tags',_MISSING)
+        if tags is not _MISSING:
+            append("TAGS:\t{}\n".format(', '.join(tags)))
+        append("ID:\t{} (API), {} (unique)\n".format(q_info.pop('id'),q_info.pop('unique_id')))
+        languages = q_info.pop('languages',_MISSING)
+        if languages is not _MISSING and languages:
+            append("LANG:\t{}\n".format(', '.join(languages)))
+        append(self.format_owner(q_info,verbose))
         del q_info['owner']
-        if 'problem_statement' in q_info:
-            text = HackerRank.clean_HTML(str(q_info['problem_statement']))
-            print("PROB:\t{}".format('\n\t'.join(wrap(text,100))))
-            del q_info['problem_statement']
+        statement = q_info.pop('problem_statement',_MISSING)
+        if statement is not _MISSING:
+            text = HackerRank.clean_HTML(str(statement))
+            append("PROB:\t{}\n".format('\n\t'.join(wrap(text,100))))
         if 'answer' in q_info and 'options' in q_info:
-            answer = q_info['answer']
-            print("ANS:",end='')
-            for n, opt in enumerate(q_info['options']):
-                print('\t{} {}'.format('*' if (n+1)==answer else ' ',opt))
-            del q_info['answer']
-            del q_info['options']
-        for key in q_info:
-            print("{}:\t{:.100}".format(key,str(q_info[key])))
+            answer = q_info.pop('answer')
+            append("ANS:")
+            for n, opt in enumerate(q_info.pop('options')):
+                append('\t{} {}\n'.format('*' if (n+1)==answer else ' ',opt))
+        for key, value in q_info.items():
+            append("{}:\t{:.100}\n".format(key,str(value)))
+        sys.stdout.write(''.join(out))
         return True
 
     @staticmethod
@@ -555,12 +961,10 @@ class HackerRank():
             if 'questions' in plag:
                 plag = plag['questions']
             # run through all of the flagged questions
-            suspects = []
-            for q in plag:
-                for other in plag[q]:
-                    s_info = plag[q][other]['occurances']
-                    for sol in s_info:
-                        suspects += [(q,s_info[sol]['email'],s_info[sol]['probability'])]
+            suspects = [(q,sol['email'],sol['probability'])
+                        for q, others in plag.items()
+                        for other in others.values()
+                        for sol in other['occurances'].values()]
             fullname = info['fullname']
             email = info['email']
             andrew = info['andrew']
@@ -589,7 +993,7 @@ class HackerRank():
 
     @staticmethod
     def display_tests(args):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         t_list = hr.list_tests()
         for t in t_list:
             print('{}:\t{}'.format(t['id'],t['name']))
@@ -597,110 +1001,99 @@ class HackerRank():
 
     @staticmethod
     def display_test(args, t_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         t_info = hr.get_test(t_id)
-        print("NAME:\t{}".format(t_info['name']))
-        del t_info['name']
+        out = []
+        append = out.append
+        append("NAME:\t{}\n".format(t_info.pop('name')))
         if not 'unique_id' in t_info:
+            sys.stdout.write(''.join(out))
             return True
-        lock = 'locked' if 'locked' in t_info and t_info['locked'] else 'unlocked'
-        draft = 'draft' if 'draft' in t_info and t_info['draft'] else 'published'
-        star = 'starred' if 'starred' in t_info and t_info['starred'] else 'unstarred'
-        print("STATUS:\t{} - {} - {} - {}".format(t_info['state'],lock,draft,star))
-        del t_info['state']
-        del t_info['locked']
-        del t_info['draft']
-        del t_info['starred']
-        print("ID:\t{} (API), {} (unique)".format(t_info['id'],t_info['unique_id']))
-        del t_info['id']
-        del t_info['unique_id']
-        print("CREATE:\t{}".format(t_info['created_at']))
-        del t_info['created_at']
-        start = t_info['start_time'] if 'start_time' in t_info else 'always'
-        stop =  t_info['end_time'] if 'end_time' in t_info else 'forever'
-        print("TIME:\t{}m - {} - {}".format(t_info['duration'],start,stop))
-        del t_info['duration']
-        del t_info['start_time']
-        del t_info['end_time']
-        if 'tags' in t_info:
-            print("TAGS:\t{}".format(', '.join(t_info['tags'])))
-            del t_info['tags']
-        hr.display_owner(t_info,args.verbose)
+        lock = 'locked' if t_info.pop('locked',None) else 'unlocked'
+        draft = 'draft' if t_info.pop('draft',None) else 'published'
+        star = 'starred' if t_info.pop('starred',None) else 'unstarred'
+        append("STATUS:\t{} - {} - {} - {}\n".format(t_info.pop('state'),lock,draft,star))
+        append("ID:\t{} (API), {} (unique)\n".format(t_info.pop('id'),t_info.pop('unique_id')))
+        append("CREATE:\t{}\n".format(t_info.pop('created_at')))
+        start = t_info.pop('start_time','always')
+        stop =  t_info.pop('end_time','forever')
+        append("TIME:\t{}m - {} - {}\n".format(t_info.pop('duration'),start,stop))
+        tags = t_info.pop('tags',_MISSING)
+        if tags is not _MISSING:
+            append("TAGS:\t{}\n".format(', '.join(tags)))
+        append(hr.format_owner(t_info,args.verbose))
         del t_info['owner']
-        if 'instructions' in t_info:
-            text = HackerRank.clean_HTML(str(t_info['instructions']))
-            print("INST:\t{}".format('\n\t'.join(wrap(text,100))))
-            del t_info['instructions']
+        instructions = t_info.pop('instructions',_MISSING)
+        if instructions is not _MISSING:
+            text = HackerRank.clean_HTML(str(instructions))
+            append("INST:\t{}\n".format('\n\t'.join(wrap(text,100))))
+        questions = t_info.pop('questions')
         if args.verbose:
             names = []
-            for q in t_info['questions']:
+            hr.prefetch_question_names(questions,verbose=False)
+            for q in questions:
                 names += ["{}: {}".format(q,hr.get_question_name(q,verbose=False))]
-            print("Q:\t{}".format('\n\t'.join(names)))
+            append("Q:\t{}\n".format('\n\t'.join(names)))
         else:
-            print("Q:\t{}".format(', '.join(t_info['questions'])))
-        del t_info['questions']
-        for key in t_info:
-            print('{}:\t{}'.format(key,t_info[key]))
+            append("Q:\t{}\n".format(', '.join(questions)))
+        for key, value in t_info.items():
+            append('{}:\t{}\n'.format(key,value))
+        sys.stdout.write(''.join(out))
         return True
 
     @staticmethod
     def display_user_list(args):
-        hr = HackerRank(verbose=args.verbose)
-        u_list = hr.list_users()
-        if 'data' in u_list:
-            u_list = u_list['data']
-        for u in u_list:
-            print('{}\t{} {} ({})'.format(u['id'],u['firstname'],u['lastname'],u['email']))
+        hr = HackerRank.client(args)
+        try:
+            for u in hr.iter_users():
+                print(f"{u['id']}\t{u['firstname']} {u['lastname']} ({u['email']})")
+        except HTTPError as err:
+            hr.report_http_error(err,'GET','users')	# after the users listed so far
         return True
 
     @staticmethod
     def display_user(args, u_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         u_info = hr.get_user(u_id)
-        print('{}\t{} {} ({}) - {} - {}'.format(u_info['id'],u_info['firstname'],u_info['lastname'],u_info['email'],
-                                                u_info['status'],u_info['role']))
-        del u_info['id']
-        del u_info['firstname']
-        del u_info['lastname']
-        del u_info['email']
-        del u_info['status']
-        del u_info['role']
-        last_time = 'never'
-        if 'last_activity_time' in u_info:
-            last_time = u_info['last_activity_time']
-        print('ACTIVE:\t{} - {}'.format(u_info['activated'],last_time))
-        del u_info['activated']
-        del u_info['last_activity_time']
-        print('ADMIN:\tcompany={}, team={}'.format(u_info['company_admin'],u_info['team_admin']))
-        del u_info['company_admin']
-        del u_info['team_admin']
+        out = []
+        append = out.append
+        append('{}\t{} {} ({}) - {} - {}\n'.format(u_info.pop('id'),u_info.pop('firstname'),u_info.pop('lastname'),
+                                                u_info.pop('email'),u_info.pop('status'),u_info.pop('role')))
+        last_time = u_info.pop('last_activity_time','never')
+        append('ACTIVE:\t{} - {}\n'.format(u_info.pop('activated'),last_time))
+        append('ADMIN:\tcompany={}, team={}\n'.format(u_info.pop('company_admin'),u_info.pop('team_admin')))
         perm = []
         for x in ['tests','questions','interviews','candidates','shared_tests','shared_questions','shared_interviews','shared_candidates']:
-            if x+'_permission' in u_info:
-                perm += ['{}:{}'.format(x,u_info[x+'_permission'])]
-                del u_info[x+'_permission']
+            p = u_info.pop(x+'_permission',_MISSING)
+            if p is not _MISSING:
+                perm += ['{}:{}'.format(x,p)]
         if perm:
-            print("PERM:\t{}".format('\n\t'.join(wrap(', '.join(perm),70))))
-        if 'teams' in u_info:
-            print("TEAMS:\t{}".format(', '.join(u_info['teams'])))
-            del u_info['teams']
-        for key in u_info:
-            print('{}:\t{}'.format(key,u_info[key]))
+            append("PERM:\t{}\n".format('\n\t'.join(wrap(', '.join(perm),70))))
+        teams = u_info.pop('teams',_MISSING)
+        if teams is not _MISSING:
+            append("TEAMS:\t{}\n".format(', '.join(teams)))
+        for key, value in u_info.items():
+            append('{}:\t{}\n'.format(key,value))
+        sys.stdout.write(''.join(out))
         return True
 
     @staticmethod
     def display_all_questions(args):
-        hr = HackerRank(verbose=args.verbose)
-        q_list = hr.list_all_questions()
-        for q in q_list:
-            hr.print_question(q,args.verbose,args.terse)
-            if not args.terse:
-                print()
+        hr = HackerRank.client(args)
+        # the compact listing omits HackerRank's own questions
+        q_list = hr.iter_all_questions(exclude_owner=HACKERRANK_OWNER_ID if args.terse else None)
+        try:
+            for q in q_list:
+                hr.print_question(q,args.verbose,args.terse)
+                if not args.terse:
+                    print()
+        except HTTPError as err:
+            hr.report_http_error(err,'GET','questions')	# after the questions listed so far
         return True
 
     @staticmethod
     def display_question(args, q_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         q_info = hr.show_question(q_id)
         if not q_info:
             print("No such question")
@@ -710,7 +1103,7 @@ class HackerRank():
 
     @staticmethod
     def display_test_candidates(args, t_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         c_list = hr.list_test_candidates(t_id)
         for c in c_list:
             if args.starttime:
@@ -721,34 +1114,36 @@ class HackerRank():
             fname = c['full_name'] if 'full_name' in c else '{unknown}'
             andrew = HackerRank.get_Andrew_ID(c)
             plag = '**' if 'plagiarism_status' in c and c['plagiarism_status'] else '' 
-            print('{}: {}{} ({}) - {}{}% @ {}'.format(c['id'],fname,andrew,c['email'],plag,c['percentage_score'],
-                                                    c['attempt_endtime']))
+            print(f"{c['id']}: {fname}{andrew} ({c['email']}) - {plag}{c['percentage_score']}% @ {c['attempt_endtime']}")
         return True
 
     @staticmethod
     def display_all_scores(args, t_id):
-        hr = HackerRank()
+        hr = HackerRank.shared_client(False)	# -v selects all questions here, not verbose HTTP logging
         c_info = hr.get_all_test_scores(t_id,args.verbose)
+        hr.prefetch_question_names(q for cand in c_info for q in cand['questions'])
         for cand in c_info:
-            print('{} ({}) {}  @ {}'.format(cand['fullname'],cand['email'],cand['andrew'],cand['endtime']))
-            questions = cand['questions']
-            for q in questions:
-                print('\t{}\t{}'.format(questions[q],hr.get_question_name(q)))
-            print('{}%\t{}\tTotal{}'.format(cand['percent'],cand['score'],'\t** Plagiarism flagged!' if cand['plag'] else ''))
+            out = []
+            append = out.append
+            append(f"{cand['fullname']} ({cand['email']}) {cand['andrew']}  @ {cand['endtime']}\n")
+            for q, score in cand['questions'].items():
+                append(f"\t{score}\t{hr.get_question_name(q)}\n")
+            flagged = '\t** Plagiarism flagged!' if cand['plag'] else ''
+            append(f"{cand['percent']}%\t{cand['score']}\tTotal{flagged}\n")
+            sys.stdout.write(''.join(out))
         return True
 
     @staticmethod
     def display_score_details(args, t_id, c_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         c_info = hr.get_test_candidate(t_id,c_id)
         fname = c_info['full_name'] if 'full_name' in c_info else '{unknown}'
         andrew = HackerRank.get_Andrew_ID(c_info)
         plag = 'plagiarism_status' in c_info and c_info['plagiarism_status'] == True
         percent = c_info['percentage_score']
         questions = c_info['questions']
-        for q in questions:
-            # cache the question names
-            hr.get_question_name(q)
+        # cache the question names
+        hr.prefetch_question_names(questions.keys())
         print('{}{} ({}) @ {}-{}'.format(fname,andrew,c_info['email'],c_info['attempt_starttime'],c_info['attempt_endtime']))
         for q in questions:
             print('\t{}\t{}'.format(questions[q],hr.get_question_name(q)))
@@ -760,18 +1155,21 @@ class HackerRank():
 
     @staticmethod
     def display_plagiarism(args, t_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         filters = [('plagiarism_status','true')]
         p_info = [HackerRank.extract_plagiarism(c) for c in hr.get_all_test_scores(t_id,filters=filters) if c['plag']]
+        # the same few questions recur across many suspects, so look each one up only once
+        hr.prefetch_question_names(s[0] for p in p_info for s in p['suspects'])
+        question_name = hr.get_question_name
         for p in p_info:
             print('{}/{} ({})'.format(p['fullname'],p['andrew'],p['email']))
             for s in p['suspects']:
-                print('\t{} - {}% on {}: {}'.format(s[1],int(s[2]),s[0],hr.get_question_name(s[0])))
+                print(f'\t{s[1]} - {int(s[2])}% on {s[0]}: {question_name(s[0])}')
         return True
         
     @staticmethod
     def display_templates(args):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         t_info = hr.list_invite_templates()
         for template in t_info:
             HackerRank.display_invite_template(template)
@@ -779,7 +1177,7 @@ class HackerRank():
 
     @staticmethod
     def display_a_template(args,t_id):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         t_info = hr.show_invite_template(t_id)
         if t_info:
             HackerRank.display_invite_template(t_info)
@@ -787,195 +1185,358 @@ class HackerRank():
 
     @staticmethod
     def display_invite(args,t_id,candidates):
-        hr = HackerRank(verbose=args.verbose)
+        hr = HackerRank.client(args)
         hr.simulate(args.dryrun)
         msg = args.message
-        for cand in candidates:
-            print('Inviting',cand)
-            response = hr.invite_test_candidate(t_id,None,cand,msg)
-            print('==>',response)
+        results = hr.invite_test_candidates(t_id,candidates,msg)
+        for cand, response in results:
+            sys.stdout.write(f'Inviting {cand}\n==> {response}\n')
         return True
 
     #### user-level commands: raw API access
     @staticmethod
-    def display_get(args, endpoint, arglist=[]):
+    def display_http(args, verb, endpoint, arglist):
         if len(arglist) % 2 != 0:
             print('must have matched parameter/value pairs')
-            return
-        hr = HackerRank(verbose=args.verbose)
-        params = list(zip(arglist[0::2],arglist[1::2]))
-        results = hr.get(endpoint,params,all_pages=args.all)
+            return True
+        hr = HackerRank.client(args)
+        it = iter(arglist)
+        params = list(zip(it,it))
+        if verb == 'get' and args.all:
+            # print each record as a line of JSON as soon as its page arrives, rather than collecting
+            #   every page into one enormous result first
+            for row in hr.iter_get(endpoint,params):
+                sys.stdout.write(json_dumps(row).decode('utf-8') + '\n')
+            return True
+        if verb == 'get':
+            results = hr.get(endpoint,params)
+        else:
+            hr.simulate(args.dryrun)
+            results = getattr(hr,verb)(endpoint,params)
+            if endpoint.lstrip('/').startswith('templates'):
+                hr.invalidate_templates()	# the cached templates may no longer match the server's
         print(results)
         return True
 
     @staticmethod
-    def display_post(args, endpoint, arglist=[]):
-        if len(arglist) % 2 != 0:
-            print('must have matched parameter/value pairs')
-            return True
-        hr = HackerRank(verbose=args.verbose)
-        hr.simulate(args.dryrun)
-        params = list(zip(arglist[0::2],arglist[1::2]))
-        results = hr.post(endpoint,params)
-        print(results)
-        return True
+    def display_get(args, endpoint, arglist=()):
+        return HackerRank.display_http(args, 'get', endpoint, arglist)
 
     @staticmethod
-    def display_put(args, endpoint, arglist=[]):
-        if len(arglist) % 2 != 0:
-            print('must have matched parameter/value pairs')
-            return True
-        hr = HackerRank(verbose=args.verbose)
-        hr.simulate(args.dryrun)
-        params = list(zip(arglist[0::2],arglist[1::2]))
-        results = hr.put(endpoint,params)
-        print(results)
-        return True
+    def display_post(args, endpoint, arglist=()):
+        return HackerRank.display_http(args, 'post', endpoint, arglist)
 
     @staticmethod
-    def display_delete(args, endpoint, arglist=[]):
-        if len(arglist) % 2 != 0:
-            print('must have matched parameter/value pairs')
-            return True
-        hr = HackerRank(verbose=args.verbose)
-        hr.simulate(args.dryrun)
-        params = list(zip(arglist[0::2],arglist[1::2]))
-        results = hr.delete(endpoint,params)
-        print(results)
-        return True
+    def display_put(args, endpoint, arglist=()):
+        return HackerRank.display_http(args, 'put', endpoint, arglist)
+
+    @staticmethod
+    def display_delete(args, endpoint, arglist=()):
+        return HackerRank.display_http(args, 'delete', endpoint, arglist)
+
+    # the built-in commands, in order of precedence, as (flag, handler, minimum number of arguments, usage
+    #   message, whether all arguments after the first are passed to the handler as a single list)
+    COMMANDS = [
+        ('showquestion', 'display_question', 1, "Usage: --showquestion {question_id}", False),
+        ('listquestions', 'display_all_questions', 0, None, False),
+        ('user', 'display_user', 1, "Usage: --user {user_id}", False),
+        ('listusers', 'display_user_list', 0, None, False),
+        ('listtests', 'display_tests', 0, None, False),
+        ('templates', 'display_templates', 0, None, False),
+        ('showtemplate', 'display_a_template', 1, "Usage: --showtemplate {template_id}", False),
+        ('showtest', 'display_test', 1, "Usage: --showtest {test_id}", False),
+        ('testscore', 'display_score_details', 2, "Usage: --testscore {test_id} {candidate_id}", False),
+        ('listcandidates', 'display_test_candidates', 1, "Usage: --listcandidates {test_id}", False),
+        ('candidatedetails', 'display_all_scores', 1, "Usage: --candidate_details {candidate_id}", False),
+        ('plagiarism', 'display_plagiarism', 1, "Usage: --plagiarism {test_id}", False),
+        ('invite', 'display_invite', 2, "Usage: --invite {test_id} {email} [{email} ...]", True),
+        ## the raw API requests
+        ('get', 'display_get', 1, "Usage: --get {endpoint} [arg1 val1 [arg2 val2 ...]]", True),
+        ('post', 'display_post', 1, "Usage: --post {endpoint} [arg1 val1 [arg2 val2 ...]]", True),
+        ('put', 'display_put', 1, "Usage: --put {endpoint} [arg1 val1 [arg2 val2 ...]]", True),
+        ('delete', 'display_delete', 1, "Usage: --delete {endpoint} [arg1 val1 [arg2 val2 ...]]", True),
+        ]
 
     @staticmethod
     def process_generic_commands(args, remargs):
-        if args.showquestion:
-            if len(remargs) < 1:
-                print("Usage: --showquestion {question_id}")
-                return True
-            return HackerRank.display_question(args, remargs[0])
-        if args.listquestions:
-            return HackerRank.display_all_questions(args)
-        if args.user:
-            if len(remargs) < 1:
-                print("Usage: --user {user_id}")
-                return True
-            return HackerRank.display_user(args, remargs[0])
-        if args.listusers:
-            return HackerRank.display_user_list(args)
-        if args.listtests:
-            return HackerRank.display_tests(args)
-        if args.templates:
-            return HackerRank.display_templates(args)
-        if args.showtemplate:
-            if len(remargs) < 1:
-                print("Usage: --showtemplate {template_id}")
-                return True
-            return HackerRank.display_a_template(args, remargs[0])
-        if args.showtest:
-            if len(remargs) < 1:
-                print("Usage: --showtest {test_id}")
-                return True
-            return HackerRank.display_test(args, remargs[0])
-        if args.testscore:
-            if len(remargs) < 1:
-                print("Usage: --testscore {test_id} {candidate_id}")
-                return True
-            return HackerRank.display_score_details(args, remargs[0], remargs[1])
-        if args.listcandidates:
-            if len(remargs) < 1:
-                print("Usage: --listcandidates {test_id}")
-                return True
-            return HackerRank.display_test_candidates(args, remargs[0])
-        if args.candidatedetails:
-            if len(remargs) < 1:
-                print("Usage: --candidate_details {candidate_id}")
-                return True
-            return HackerRank.display_all_scores(args, remargs[0])
-        if args.plagiarism:
-            if len(remargs) < 1:
-                print("Usage: --plagiarism {test_id}")
-                return True
-            return HackerRank.display_plagiarism(args, remargs[0])
-        if args.invite:
-            if len(remargs) < 2:
-                print("Usage: --invite {test_id} {email} [{email} ...]")
-                return True
-            return HackerRank.display_invite(args, remargs[0], remargs[1:])
-        ## process the raw API requests
-        if args.get is True:
-            if len(remargs) < 1:
-                print("Usage: --get {endpoint} [arg1 val1 [arg2 val2 ...]]")
-                return True
-            return HackerRank.display_get(args, remargs[0],remargs[1:])
-        if args.post is True:
-            if len(remargs) < 1:
-                print("Usage: --post {endpoint} [arg1 val1 [arg2 val2 ...]]")
-                return True
-            return HackerRank.display_post(args, remargs[0], remargs[1:])
-        if args.put is True:
-            if len(remargs) < 1:
-                print("Usage: --put {endpoint} [arg1 val1 [arg2 val2 ...]]")
-                return True
-            return HackerRank.display_put(args, remargs[0], remargs[1:])
-        if args.delete is True:
-            if len(remargs) < 1:
-                print("Usage: --delete {endpoint} [arg1 val1 [arg2 val2 ...]]")
+        for flag, handler, minargs, usage, rest in HackerRank.COMMANDS:
+            if not getattr(args,flag,False):
+                continue
+            if len(remargs) < minargs:
+                print(usage)
                 return True
-            return HackerRank.display_delete(args, remargs[0], remargs[1:])
+            handler = getattr(HackerRank,handler)
+            if rest:
+                return handler(args, remargs[0], remargs[1:])
+            return handler(args, *remargs[:minargs])
         return False
 
-    @staticmethod
-    def parse_arguments(flag_adder = None):
-        parser = argparse.ArgumentParser(description="Commandline control of HackerRank account")
-        parser.add_argument("-n","--dryrun",action="store_true",help="do everything except actually change values on server")
-        parser.add_argument("-v","--verbose",action="store_true",help="run with verbose output")
+    # commandline flags as (group, option strings, add_argument keywords), in help-listing order;
+    #   flags in a named group are only added to the parser if the commandline might refer to them
+    CMDLINE_FLAGS = [
+        (None, ("-n","--dryrun"), dict(action="store_true",help="do everything except actually change values on server")),
+        (None, ("-v","--verbose"), dict(action="store_true",help="run with verbose output")),
         ## useful informational functions
-        parser.add_argument("--listquestions",action="store_true",help="show list of all test questions")
-        parser.add_argument("-Q","--showquestion",action="store_true",help="display test question")
-        parser.add_argument("-U","--listusers",action="store_true",help="return a list of user IDs")
-        parser.add_argument("-u","--user",action="store_true",help="show information about a specific user")
-        parser.add_argument("-T","--listtests",action="store_true",help="list available tests")
-        parser.add_argument("-t","--showtest",action="store_true",help="display details of a test")
-        parser.add_argument("-c","--listcandidates",action="store_true",help="display list of candidates taking test")
-        parser.add_argument("--starttime",action="store_true",help="add attempt start time to candidate listing")
-        parser.add_argument("-C","--candidatedetails",action="store_true",help="display detailed results of candidates taking test")
-        parser.add_argument("-S","--testscore",action="store_true",help="display detailed score on test T by candidate C")
-        parser.add_argument("-P","--plagiarism",action="store_true",help="analyze plagiarism flags for test")
-        parser.add_argument("--templates",action="store_true",help="display all invitation templates")
-        parser.add_argument("--showtemplate",action="store_true",help="display specified invitation template")
-
-        parser.add_argument("--terse",action="store_true",help="compact display of key items only")
+        (None, ("--listquestions",), dict(action="store_true",help="show list of all test questions")),
+        (None, ("-Q","--showquestion"), dict(action="store_true",help="display test question")),
+        (None, ("-U","--listusers"), dict(action="store_true",help="return a list of user IDs")),
+        (None, ("-u","--user"), dict(action="store_true",help="show information about a specific user")),
+        (None, ("-T","--listtests"), dict(action="store_true",help="list available tests")),
+        (None, ("-t","--showtest"), dict(action="store_true",help="display details of a test")),
+        (None, ("-c","--listcandidates"), dict(action="store_true",help="display list of candidates taking test")),
+        (None, ("--starttime",), dict(action="store_true",help="add attempt start time to candidate listing")),
+        (None, ("-C","--candidatedetails"), dict(action="store_true",help="display detailed results of candidates taking test")),
+        (None, ("-S","--testscore"), dict(action="store_true",help="display detailed score on test T by candidate C")),
+        (None, ("-P","--plagiarism"), dict(action="store_true",help="analyze plagiarism flags for test")),
+        ('templates', ("--templates",), dict(action="store_true",help="display all invitation templates")),
+        ('templates', ("--showtemplate",), dict(action="store_true",help="display specified invitation template")),
+
+        (None, ("--terse",), dict(action="store_true",help="compact display of key items only")),
 
         ## management functions
-        parser.add_argument("--invite",action="store_true",help="send invitation to test T to candidates C1,C2...")
-        parser.add_argument("--message",metavar="MSG",help="set custom message for invitation")
+        ('invite', ("--invite",), dict(action="store_true",help="send invitation to test T to candidates C1,C2...")),
+        ('invite', ("--message",), dict(metavar="MSG",help="set custom message for invitation")),
 
         ## raw API access for experimenting
-        parser.add_argument("--get",action="store_true",help="perform a raw API 'get' call")
-        parser.add_argument("--put",action="store_true",help="perform a raw API 'put' call (USE CAUTION!)")
-        parser.add_argument("--post",action="store_true",help="perform a raw API 'post' call (USE CAUTION!)")
-        parser.add_argument("--delete",action="store_true",help="perform a raw API 'delete' call (USE CAUTION!)")
-        parser.add_argument("--all",action="store_true",help="retrieve all pages for a GET request -- may be very slow")
-        if flag_adder:
-            if type(flag_adder) is type([]):
-                for adder in flag_adder:
-                    adder(parser)
+        ('raw', ("--get",), dict(action="store_true",help="perform a raw API 'get' call")),
+        ('raw', ("--put",), dict(action="store_true",help="perform a raw API 'put' call (USE CAUTION!)")),
+        ('raw', ("--post",), dict(action="store_true",help="perform a raw API 'post' call (USE CAUTION!)")),
+        ('raw', ("--delete",), dict(action="store_true",help="perform a raw API 'delete' call (USE CAUTION!)")),
+        ('raw', ("--all",), dict(action="store_true",help="retrieve all pages for a GET request (fetched in parallel)")),
+        ]
+
+    @staticmethod
+    def needed_flag_groups(argv):
+        all_groups = frozenset(group for group, _, _ in HackerRank.CMDLINE_FLAGS if group)
+        if not argv:
+            return all_groups	# we'll be printing the full usage message
+        groups = set()
+        for tok in argv:
+            if tok == '--':
+                break
+            if not tok.startswith('--'):
+                if tok.startswith('-') and 'h' in tok:
+                    return all_groups
+                continue
+            # argparse accepts any unambiguous prefix of a long option, with or without '=value'
+            name = tok.split('=',1)[0]
+            if len(name) <= 2:
+                continue
+            if '--help'.startswith(name):
+                return all_groups
+            for group, opts, _ in HackerRank.CMDLINE_FLAGS:
+                if group and any(opt.startswith(name) for opt in opts):
+                    groups.add(group)
+        return frozenset(groups)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def build_parser(groups, flag_adders, epilog=None):
+        import argparse
+        parser = argparse.ArgumentParser(description="Commandline control of HackerRank account",epilog=epilog)
+        defaults = {}
+        for group, opts, kwargs in HackerRank.CMDLINE_FLAGS:
+            if group is None or group in groups:
+                parser.add_argument(*opts,**kwargs)
             else:
-                flag_adder(parser)
-        if len(sys.argv) <= 1:
+                defaults[opts[-1].lstrip('-')] = False if kwargs.get('action') == 'store_true' else None
+        parser.set_defaults(**defaults)
+        for adder in flag_adders:
+            adder(parser)
+        return parser
+
+    @staticmethod
+    def parse_arguments(flag_adder = None, argv = None, epilog = None):
+        if argv is None:
+            argv = sys.argv[1:]
+        if not flag_adder:
+            flag_adders = ()
+        elif type(flag_adder) is type([]):
+            flag_adders = tuple(flag_adder)
+        else:
+            flag_adders = (flag_adder,)
+        parser = HackerRank.build_parser(HackerRank.needed_flag_groups(argv), flag_adders, epilog)
+        if not argv:
             parser.print_usage()
             parser.exit()
-        args, remargs = parser.parse_known_args()
-        if 'all' not in args:
-            args.all = False
+        args, remargs = parser.parse_known_args(argv)
+        args.all = getattr(args,'all',False)
         return args, remargs
+
+    @staticmethod
+    def fast_parse_arguments(argv):
+        # most invocations are just a few on/off flags plus IDs, which don't need argparse at all; anything
+        #   else (help, option values, abbreviated or bundled flags, '--') returns None to use parse_arguments
+        if not argv:
+            return None	# parse_arguments prints the usage message
+        flags = {}
+        args = {}
+        for _, opts, kwargs in HackerRank.CMDLINE_FLAGS:
+            dest = opts[-1].lstrip('-')
+            if kwargs.get('action') == 'store_true':
+                args[dest] = False
+                for opt in opts:
+                    flags[opt] = dest
+            else:
+                args[dest] = None
+        remargs = []
+        for tok in argv:
+            if not tok.startswith('-'):
+                remargs.append(tok)
+            elif tok in flags:
+                args[flags[tok]] = True
+            else:
+                return None
+        return types.SimpleNamespace(**args), remargs
         
-def main():
-    args, remargs = HackerRank.parse_arguments()
+# the output of 'COLUMNS=80 hackerrank.py --help' under Python 3.10+ (older versions head the list with
+#   "optional arguments:"), so that asking for help doesn't have to build the full argument parser;
+#   regenerate this whenever CMDLINE_FLAGS changes
+_STATIC_HELP = '''\
+usage: hackerrank.py [-h] [-n] [-v] [--listquestions] [-Q] [-U] [-u] [-T] [-t]
+                     [-c] [--starttime] [-C] [-S] [-P] [--templates]
+                     [--showtemplate] [--terse] [--invite] [--message MSG]
+                     [--get] [--put] [--post] [--delete] [--all]
+
+Commandline control of HackerRank account
+
+options:
+  -h, --help            show this help message and exit
+  -n, --dryrun          do everything except actually change values on server
+  -v, --verbose         run with verbose output
+  --listquestions       show list of all test questions
+  -Q, --showquestion    display test question
+  -U, --listusers       return a list of user IDs
+  -u, --user            show information about a specific user
+  -T, --listtests       list available tests
+  -t, --showtest        display details of a test
+  -c, --listcandidates  display list of candidates taking test
+  --starttime           add attempt start time to candidate listing
+  -C, --candidatedetails
+                        display detailed results of candidates taking test
+  -S, --testscore       display detailed score on test T by candidate C
+  -P, --plagiarism      analyze plagiarism flags for test
+  --templates           display all invitation templates
+  --showtemplate        display specified invitation template
+  --terse               compact display of key items only
+  --invite              send invitation to test T to candidates C1,C2...
+  --message MSG         set custom message for invitation
+  --get                 perform a raw API 'get' call
+  --put                 perform a raw API 'put' call (USE CAUTION!)
+  --post                perform a raw API 'post' call (USE CAUTION!)
+  --delete              perform a raw API 'delete' call (USE CAUTION!)
+  --all                 retrieve all pages for a GET request (fetched in
+                        parallel)
+
+Run 'hackerrank.py --daemon' to keep a server process (and its caches) alive,
+then give commands as 'hackerrank.py --client ARGS...'.
+'''
+# the --daemon and --client modes are only available through main(), so only its help mentions them
+_MAIN_EPILOG = ("Run 'hackerrank.py --daemon' to keep a server process (and its caches) alive, "
+                "then give commands as 'hackerrank.py --client ARGS...'.")
+
+# just the usage lines, which are printed when no arguments are given
+_USAGE = _STATIC_HELP[:_STATIC_HELP.index('\n\n')+1]
+
+def run_command(argv):
+    args, remargs = HackerRank.fast_parse_arguments(argv) or HackerRank.parse_arguments(argv=argv,epilog=_MAIN_EPILOG)
     if HackerRank.process_generic_commands(args,remargs):
         return
     else:
         print('This sample interface only supports the built-in display functions.')
     return
 
+def daemon_socket_path():
+    rundir = os.environ.get('XDG_RUNTIME_DIR')
+    if rundir:
+        return os.path.join(rundir, DAEMON_SOCKET)
+    return os.path.join(os.environ['HOME'], '.' + DAEMON_SOCKET)
+
+def serve_command(conn):
+    # run one commandline received from a client, sending everything it prints back over the connection
+    import contextlib, traceback
+    with conn, conn.makefile('rb') as inp, conn.makefile('wb') as outp:
+        try:
+            argv = json_loads(inp.readline())
+        except ValueError:
+            argv = None
+        if not isinstance(argv,list) or not all(isinstance(arg,str) for arg in argv):
+            return	# not one of our clients, or it went away before sending its commandline
+        for hr in HackerRank.shared_clients:
+            hr.reset_run_caches()
+        out = io.TextIOWrapper(outp, encoding='utf-8')
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                run_command(argv)
+            except SystemExit:
+                pass	# argparse has already printed its usage or error message
+            except Exception:
+                traceback.print_exc()
+        out.flush()
+    return
+
+def serve_commands():
+    # keep one process alive so that the API connections and the question-name caches of the shared
+    #   client are reused by every command; commands are run one at a time, since each takes over sys.stdout
+    import signal, socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))	# so that the socket gets removed
+    path = daemon_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        try:
+            os.unlink(path)	# left over from a previous daemon
+        except FileNotFoundError:
+            pass
+        old_umask = os.umask(0o177)	# only the owner can connect, since we act with the owner's API token
+        try:
+            server.bind(path)
+        finally:
+            os.umask(old_umask)
+        server.listen()
+        print('Serving commands on {}'.format(path))
+        sys.stdout.flush()
+        try:
+            while True:
+                conn, _ = server.accept()
+                try:
+                    serve_command(conn)
+                except Exception as err:	# e.g. the client went away, but keep serving the others
+                    print('Error serving client: {}'.format(err), file=sys.stderr)
+        finally:
+            os.unlink(path)
+    return
+
+def forward_command(argv):
+    import socket
+    path = daemon_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            print('No hackerrank.py --daemon is listening on {}'.format(path), file=sys.stderr)
+            sys.exit(1)
+        sock.sendall(json_dumps(argv) + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        for chunk in iter(functools.partial(sock.recv, 65536), b''):
+            out.write(chunk)
+        out.flush()
+    return
+
+def main():
+    argv = sys.argv[1:]
+    # no arguments or a bare request for help can be answered without building the argument parser
+    if argv in ([],['-h'],['--help']) and os.path.basename(sys.argv[0]) == 'hackerrank.py' and \
+       sys.version_info >= (3,10):
+        sys.stdout.write(_STATIC_HELP if argv else _USAGE)
+        return
+    if argv == ['--daemon']:
+        return serve_commands()
+    if argv[:1] == ['--client']:
+        return forward_command(argv[1:])
+    run_command(argv)
+    return
+
 if __name__ == '__main__':
     main()
 